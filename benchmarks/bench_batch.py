@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  bench_batch.py  --- Batch open benchmark
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Compares the throughput of openMany (thread and process pools) with the
+serial loop over DM3(...) when reading the tags and image of many files.
+
+Usage: python benchmarks/bench_batch.py [-n COPIES] [-w WORKERS] [FILE ...]
+'''
+
+import argparse
+import glob
+import os
+import sys
+from time import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'utils'))
+
+from PyDM3 import DM3, openMany  # noqa: E402
+
+
+def serial(files):
+    for fname in files:
+        dm3 = DM3(fname)
+        dict(dm3.tags.items())
+        dm3.image
+
+
+def batch(files, workers, processes):
+    for result in openMany(files, workers=workers, what=('tags', 'image'), processes=processes):
+        if result.error is not None:
+            raise SystemExit("Error reading '%s': %r" % (result.filename, result.error))
+
+
+def main():
+    examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'examples', '*.dm3')
+    parser = argparse.ArgumentParser(description='DM3 batch open benchmark')
+    parser.add_argument('-n', '--copies', type=int, default=20, help='times each file is added to the batch')
+    parser.add_argument('-w', '--workers', type=int, default=os.cpu_count(), help='pool size')
+    parser.add_argument('files', nargs='*', default=sorted(glob.glob(examples)))
+    args = parser.parse_args()
+
+    files = args.files*args.copies
+    print('%i files, %i workers' % (len(files), args.workers))
+    t0 = time()
+    serial(files)
+    t_serial = time() - t0
+    print('%-10s %10.3f s %10.1f files/s' % ('serial', t_serial, len(files)/t_serial))
+    for name, processes in (('threads', False), ('processes', True)):
+        t0 = time()
+        batch(files, args.workers, processes)
+        t = time() - t0
+        print('%-10s %10.3f s %10.1f files/s %7.1fx' % (name, t, len(files)/t, t_serial/t))
+
+
+if __name__ == '__main__':
+    main()
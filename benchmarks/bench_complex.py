@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  bench_complex.py  --- Complex data decoding benchmark
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Compares the time and peak memory needed to decode complex image data
+(DataType 3 and 13) the way DM3.image did before, building the array from
+the real and imaginary parts, and as a complex view of the raw data.
+
+Usage: python benchmarks/bench_complex.py [-s SIZE] [-d DEPTH]
+'''
+
+import argparse
+import gc
+import tracemalloc
+from time import time
+
+import numpy as np
+
+
+def before(raw, part):
+    im = np.frombuffer(raw, dtype=part)
+    return im[::2] + 1.0j*im[1::2]
+
+
+def after(raw, part):
+    return np.frombuffer(raw, dtype='<c%i' % (2*np.dtype(part).itemsize))
+
+
+def measure(func, raw, part):
+    # returns the time and the peak memory (besides the raw data) of func
+    gc.collect()
+    tracemalloc.start()
+    t0 = time()
+    result = func(raw, part)
+    t = time() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, t, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Complex data decoding benchmark')
+    parser.add_argument('-s', '--size', type=int, default=4096, help='image width and height')
+    parser.add_argument('-d', '--depth', type=int, default=1, help='number of images in the stack')
+    args = parser.parse_args()
+
+    print('%-10s %12s %12s %12s %14s %14s' % ('type', 'data (MB)', 'before (ms)', 'after (ms)',
+                                              'before (MB)', 'after (MB)'))
+    for data_type, part in ((3, '<f4'), (13, '<f8')):
+        n = args.size*args.size*args.depth
+        raw = np.random.default_rng(0).standard_normal(2*n).astype(part).tobytes()
+        old, t_old, m_old = measure(before, raw, part)
+        new, t_new, m_new = measure(after, raw, part)
+        if not np.array_equal(old, new):
+            raise SystemExit('Decoded data differ for DataType %i' % data_type)
+        del old, new
+        print('%-10s %12.1f %12.2f %12.2f %14.1f %14.1f' % (data_type, len(raw)/1e6, 1e3*t_old, 1e3*t_new,
+                                                             m_old/1e6, m_new/1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  bench_fft.py  --- Packed complex (FFT) unpacking check
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Checks the unpacking of packed complex data (DataType 5, the FFTs saved by
+DigitalMicrograph) and times it:
+- every pair IMAGE.dm3, IMAGE-FFT.dm3 in the examples: the FFT is the one of
+  a window of the image, found by its DC value, and the unpacked data must
+  match conj(fft2(window)), centred;
+- random real images of several sizes, packed the way DigitalMicrograph
+  does, must round-trip through unpackComplex.
+Exits with status 1 if the relative error is larger than the tolerance.
+
+Usage: python benchmarks/bench_fft.py [-t TOLERANCE] [-n RUNS] [DIRECTORY]
+'''
+
+import argparse
+import glob
+import os
+import sys
+from time import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'utils'))
+
+from PyDM3 import DM3, unpackComplex  # noqa: E402
+
+SIZES = ((2, 2), (6, 10), (12, 4), (64, 32), (256, 256))
+CANDIDATES = 8  # windows (with the closest DC values) compared in full
+
+
+def pack(image):
+    # packs the (conjugate) FFT of a real image the way DigitalMicrograph does (see unpackComplex)
+    h, w = image.shape
+    h2, w2 = h//2, w//2
+    fft = np.conj(np.fft.fft2(image))
+    packed = np.zeros((h, w), dtype='<f4')
+    rows = fft[(np.arange(h) - h2) % h]  # row p holds ky = p - h/2
+    packed[:, 2::2] = rows[:, 1:w2].real
+    packed[:, 3::2] = rows[:, 1:w2].imag
+    packed[h2 + 1:, 0] = fft[1:h2, 0].real
+    packed[h2 + 1:, 1] = fft[1:h2, 0].imag
+    packed[1:h2, 0] = fft[1:h2, w2].real
+    packed[1:h2, 1] = fft[1:h2, w2].imag
+    packed[h2, 0] = fft[0, 0].real
+    packed[h2, 1] = fft[h2, 0].real
+    packed[0, 0] = fft[0, w2].real
+    packed[0, 1] = fft[h2, w2].real
+    return packed, np.fft.fftshift(fft)
+
+
+def error(result, expected):
+    return np.abs(result - expected).max()/np.abs(expected).max()
+
+
+def window(image, fft):
+    # returns the window of image whose FFT is fft, and the error of the match
+    h, w = fft.shape
+    dc = fft[h//2, w//2].real
+    c = np.pad(image, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    sums = c[h:, w:] - c[:-h, w:] - c[h:, :-w] + c[:-h, :-w]
+    best = None
+    for i in np.argsort(np.abs(sums - dc), axis=None)[:CANDIDATES]:
+        y, x = np.unravel_index(i, sums.shape)
+        err = error(fft, np.fft.fftshift(np.conj(np.fft.fft2(image[y:y + h, x:x + w]))))
+        if best is None or err < best[1]:
+            best = ((y, x), err)
+    return best
+
+
+def timed(packed, runs):
+    t0 = time()
+    for _ in range(runs):
+        result = unpackComplex(packed)
+    return result, (time() - t0)/runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Packed complex (FFT) unpacking check')
+    parser.add_argument('-t', '--tolerance', type=float, default=1e-6, help='largest relative error')
+    parser.add_argument('-n', '--runs', type=int, default=10, help='timed unpackings per image')
+    parser.add_argument('directory', nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'examples'))
+    args = parser.parse_args()
+
+    failed = False
+    print('%-20s %12s %12s %12s' % ('data', 'window', 'error', 'unpack (ms)'))
+    for fname in sorted(glob.glob(os.path.join(args.directory, '*-FFT.dm3'))):
+        source = fname[:-len('-FFT.dm3')] + '.dm3'
+        if not os.path.exists(source):
+            continue
+        fft = DM3(fname).image
+        image = DM3(source).image.astype(np.float64)
+        (y, x), err = window(image, fft)
+        packed = pack(image[y:y + fft.shape[0], x:x + fft.shape[1]])[0]
+        t = timed(packed, args.runs)[1]
+        failed |= err > args.tolerance
+        print('%-20s %12s %12.2e %12.3f' % (os.path.basename(fname), '%i,%i' % (x, y), err, 1e3*t))
+    rng = np.random.default_rng(0)
+    for h, w in SIZES:
+        packed, expected = pack(rng.standard_normal((h, w)))
+        result, t = timed(packed, args.runs)
+        err = error(result, expected)
+        failed |= err > args.tolerance
+        print('%-20s %12s %12.2e %12.3f' % ('random %ix%i' % (w, h), '', err, 1e3*t))
+    if failed:
+        print('Errors larger than %g' % args.tolerance)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  bench_import.py  --- Import time benchmark
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Measures the time taken by a fresh interpreter to import the DM3 reader
+(utils.PyDM3), on top of numpy, and checks that no GUI module (PyQt5,
+matplotlib) is imported with it. Exits with status 1 if the import takes
+longer than the budget or pulls in a GUI module.
+
+Usage: python benchmarks/bench_import.py [-n RUNS] [-b BUDGET_MS]
+'''
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+GUIMODULES = ('PyQt5', 'matplotlib')
+
+# - run in a fresh interpreter: numpy first, so its (fixed) cost is measured apart
+PROBE = '''
+import sys
+from time import perf_counter
+t0 = perf_counter()
+import numpy
+t1 = perf_counter()
+import utils.PyDM3
+t2 = perf_counter()
+gui = sorted(set(name.split('.')[0] for name in sys.modules) & set(%r))
+print(t1 - t0, t2 - t1, ','.join(gui))
+''' % (GUIMODULES,)
+
+
+def probe():
+    # returns the import times of numpy and of the reader, and the GUI modules loaded
+    output = subprocess.check_output([sys.executable, '-c', PROBE], cwd=ROOT, universal_newlines=True)
+    numpy_time, core_time, gui = output.split(' ')
+    return float(numpy_time), float(core_time), [name for name in gui.strip().split(',') if name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DM3 reader import time benchmark')
+    parser.add_argument('-n', '--runs', type=int, default=10, help='fresh interpreters started')
+    parser.add_argument('-b', '--budget', type=float, default=25.0,
+                        help='maximum import time of the reader (ms, without numpy)')
+    args = parser.parse_args()
+
+    # - the bytecode is compiled (and written) once, outside the measured runs
+    subprocess.check_call([sys.executable, '-m', 'compileall', '-q', os.path.join(ROOT, 'utils')])
+    runs = [probe() for i in range(args.runs)]
+    numpy_time = min(run[0] for run in runs)*1000
+    core_time = min(run[1] for run in runs)*1000
+    gui = sorted(set(name for run in runs for name in run[2]))
+
+    print('%-12s %10s' % ('import', 'time (ms)'))
+    print('%-12s %10.1f' % ('numpy', numpy_time))
+    print('%-12s %10.1f' % ('utils.PyDM3', core_time))
+    if gui:
+        raise SystemExit("utils.PyDM3 imports GUI modules: %s" % ", ".join(gui))
+    if core_time > args.budget:
+        raise SystemExit("utils.PyDM3 takes %.1f ms to import (budget: %.1f ms)" % (core_time, args.budget))
+
+
+if __name__ == '__main__':
+    main()
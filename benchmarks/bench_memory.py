@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  bench_memory.py  --- Tag store memory benchmark
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Compares the memory held by the typed tag tree of a DM3 object with the
+flat representation used before (a list of b"name = value" lines plus a
+dict of dotted names to values formatted as bytes), for the files with
+the most tags.
+
+Usage: python benchmarks/bench_memory.py [-k TOP] [FILE ...]
+'''
+
+import argparse
+import gc
+import glob
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'utils'))
+
+from PyDM3 import DM3  # noqa: E402
+
+
+def as_bytes(value):
+    # formats a tag value as the old flat store did
+    if type(value) is int:
+        return b"%i" % value
+    elif type(value) is float:
+        return b"%f" % value
+    elif type(value) is str:
+        return value.encode()
+    elif type(value) is bool:
+        return b"%r" % value
+    elif type(value) is tuple:
+        # - struct tags (stored since the element types are kept)
+        return b"(%s)" % b", ".join(as_bytes(field) for field in value)
+    return value
+
+
+def flat_store(dm3):
+    # rebuilds the flat list + dict representation of the tags
+    stored_tags = []
+    tag_dict = {}
+    for name, value in dm3.tags.items():
+        value = as_bytes(value)
+        stored_tags.append(b"%s = %s" % (name, value))
+        tag_dict[bytes(name)] = value
+    return stored_tags, tag_dict
+
+
+def traced(func):
+    # returns the result of func() and the memory it still holds
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'examples', '*.dm3')
+    parser = argparse.ArgumentParser(description='DM3 tag store memory benchmark')
+    parser.add_argument('-k', '--top', type=int, default=5, help='number of files with most tags to measure')
+    parser.add_argument('files', nargs='*', default=sorted(glob.glob(examples)))
+    args = parser.parse_args()
+
+    files = sorted(args.files, key=lambda fname: -len(DM3(fname).tags))[:args.top]
+
+    print('%-20s %6s %12s %12s %8s' % ('file', 'tags', 'flat (KiB)', 'tree (KiB)', 'ratio'))
+    for fname in files:
+        dm3, tree = traced(lambda: DM3(fname, lazy=False))
+        # - the tree is measured with the rest of the DM3 object, the flat
+        #   store on its own (its values come from the already decoded tree)
+        flat, flat_size = traced(lambda: flat_store(dm3))
+        print('%-20s %6i %12.1f %12.1f %7.2fx' % (os.path.basename(fname), len(flat[1]), flat_size/1024.0,
+                                                  tree/1024.0, float(flat_size)/tree))
+
+
+if __name__ == '__main__':
+    main()
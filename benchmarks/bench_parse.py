@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  bench_parse.py  --- Tag parsing benchmark
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Compares the time needed to parse the tags of the DM3 files in examples/
+with the buffer-based reader and with the field-by-field file reader.
+
+Usage: python benchmarks/bench_parse.py [-n REPEAT] [FILE ...]
+'''
+
+import argparse
+import glob
+import os
+import sys
+from timeit import repeat
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'utils'))
+
+from PyDM3 import DM3  # noqa: E402
+
+
+def best_time(fname, repeats, **kwargs):
+    return min(repeat(lambda: DM3(fname, **kwargs), number=1, repeat=repeats))
+
+
+def main():
+    examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'examples', '*.dm3')
+    parser = argparse.ArgumentParser(description='DM3 tag parsing benchmark')
+    parser.add_argument('-n', '--repeat', type=int, default=20, help='repetitions per file (best is kept)')
+    parser.add_argument('files', nargs='*', default=sorted(glob.glob(examples)))
+    args = parser.parse_args()
+
+    print('%-20s %6s %12s %12s %8s' % ('file', 'tags', 'file (ms)', 'buffer (ms)', 'speedup'))
+    total_file = total_buffer = 0.0
+    for fname in args.files:
+        tags = DM3(fname).tags
+        if DM3(fname, buffered=False).tags != tags:
+            raise SystemExit("Tags differ between readers for '%s'" % fname)
+        t_file = best_time(fname, args.repeat, buffered=False)
+        t_buffer = best_time(fname, args.repeat, buffered=True)
+        total_file += t_file
+        total_buffer += t_buffer
+        print('%-20s %6i %12.3f %12.3f %7.1fx' % (os.path.basename(fname), len(tags), 1e3*t_file,
+                                                  1e3*t_buffer, t_file/t_buffer))
+    if args.files:
+        print('%-20s %6s %12.3f %12.3f %7.1fx' % ('total', '', 1e3*total_file, 1e3*total_buffer,
+                                                  total_file/total_buffer))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  bench_suite.py  --- Parse and decode benchmark suite
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Measures, for each file and open mode, the time to parse the tags, to
+decode the image and to scan its data once, the peak memory (RSS) of the
+process, the throughput in MB/s of image data and the time of each stage
+of the reader (DM3.timings). Each measurement runs in a fresh process, so
+the peak RSS belongs to that file and mode alone. The files are given, or generated with gendm3.py from -g specifications
+WxH[xD][:TYPE[:TAGS[:VERSION]]] (e.g. 256x256x2048:2:5000:4).
+
+The 'viewer' mode repeats what the viewer does when a file is opened
+(readFile and loadImage, without drawing) with empty caches, 'viewer-warm'
+with the caches written by a previous visit. Results are written to a JSON
+file, so runs can be compared.
+
+Usage: python benchmarks/bench_suite.py [-g SPEC ...] [-m MODE ...] [-n REPEAT] [-o JSON] [FILE ...]
+'''
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, os.pardir, 'utils'))
+sys.path.insert(0, HERE)
+
+import gendm3  # noqa: E402
+
+DEFAULTSPECS = ('2048x2048:2:1000', '4096x4096:1:100', '128x128x1024:2:1000:4', '1024x1024:13:100')
+PYRAMIDSIZE = 2048  # pyramid_size of the viewer (utils/plot/pltMpl.py)
+
+# - mode -> keyword arguments of DM3
+MODES = {
+    'buffered': {},
+    'unbuffered': {'buffered': False},
+    'lazy': {'lazy': True},
+    'mmap': {'lazy': True, 'mmap_mode': 'r'},
+    'viewer': {'mmap_mode': 'c', 'lazy': True, 'tag_cache': True},
+    'viewer-warm': {'mmap_mode': 'c', 'lazy': True, 'tag_cache': True},
+}
+
+
+def peak_rss():
+    # returns the peak resident memory of the process in MB (None if unknown)
+    try:
+        # - Linux: ru_maxrss would include the peak of the parent (kept across exec)
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])/1024.0
+    except (IOError, OSError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss/(1 << 20) if sys.platform == 'darwin' else rss/1024.0
+
+
+def viewer_decode(dm3):
+    # what the viewer does with an opened file (Mpl3DPlot.loadImage), without Qt
+    from DM3Pyramid import ImagePyramid
+
+    data = dm3.imagedata
+    if dm3.imagetype == 2 and data.ndim == 3:
+        # - the spectrum shown first (the data stays mapped)
+        return dm3.spectrumAt(0, 0)
+    if data.ndim == 2 and not np.iscomplexobj(data) and max(data.shape) > PYRAMIDSIZE:
+        # - the level shown on a full HD screen
+        return ImagePyramid(dm3).levelFor(1920, 1080)
+    dm3.imagestats
+    return data
+
+
+def measure(fname, mode):
+    # runs in the child process: opens fname in mode and times each stage
+    from PyDM3 import DM3
+
+    base_rss = peak_rss()
+    t0 = perf_counter()
+    dm3 = DM3(fname, **MODES[mode])
+    t1 = perf_counter()
+    image = viewer_decode(dm3) if mode.startswith('viewer') else dm3.image
+    t2 = perf_counter()
+    np.sum(image)  # every page of the data is read
+    t3 = perf_counter()
+    return {'parse_s': t1 - t0, 'decode_s': t2 - t1, 'scan_s': t3 - t2, 'total_s': t3 - t0,
+            'peak_rss_mb': peak_rss(), 'base_rss_mb': base_rss, 'stages': dm3.timings.stats}
+
+
+def run_child(fname, mode, cache):
+    # measures fname in mode in a fresh process (with its caches in cache)
+    env = dict(os.environ, XDG_CACHE_HOME=cache)
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child', fname, mode],
+                                     env=env, universal_newlines=True)
+    return json.loads(output)
+
+
+def generate(spec, directory, pattern):
+    # writes the file described by spec (WxH[xD][:TYPE[:TAGS[:VERSION]]]) and returns its name
+    fields = spec.split(':')
+    dimensions = tuple(int(n) for n in fields[0].lower().split('x'))
+    data_type = int(fields[1]) if len(fields) > 1 else 2
+    ntags = int(fields[2]) if len(fields) > 2 else 100
+    version = int(fields[3]) if len(fields) > 3 else 3
+    fname = os.path.join(directory, 'synthetic-%s.dm%i' % (spec.replace(':', '-'), version))
+    gendm3.write(fname, dimensions, data_type, ntags, version, pattern)
+    return fname
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        print(json.dumps(measure(sys.argv[2], sys.argv[3])))
+        return
+
+    parser = argparse.ArgumentParser(description='DM3 parse and decode benchmark suite')
+    parser.add_argument('-g', '--generate', action='append', metavar='SPEC',
+                        help='synthetic file to generate (may be repeated)')
+    parser.add_argument('-p', '--pattern', default='ramp', choices=gendm3.PATTERNS, help='synthetic image data')
+    parser.add_argument('-m', '--mode', action='append', choices=sorted(MODES), help='open mode (may be repeated)')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='runs per file and mode (best is kept)')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='JSON file with the results')
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_suite')
+    try:
+        specs = args.generate or ([] if args.files else DEFAULTSPECS)
+        files = list(args.files) + [generate(spec, workdir, args.pattern) for spec in specs]
+        modes = args.mode or sorted(MODES)
+
+        from PyDM3 import DM3
+
+        results = []
+        print('%-36s %-11s %9s %9s %9s %9s %9s %9s' % ('file', 'mode', 'data (MB)', 'parse (s)', 'decode (s)',
+                                                        'scan (s)', 'MB/s', 'RSS (MB)'))
+        for fname in files:
+            with DM3(fname, lazy=True) as dm3:
+                data_mb = dm3._imageLayout()[1]/float(1 << 20)
+            for mode in modes:
+                runs = []
+                for i in range(args.repeat):
+                    cache = tempfile.mkdtemp(dir=workdir)
+                    if mode == 'viewer-warm':
+                        run_child(fname, mode, cache)  # the first visit fills the caches
+                    runs.append(run_child(fname, mode, cache))
+                    shutil.rmtree(cache)
+                best = min(runs, key=lambda run: run['total_s'])
+                best.update({'file': os.path.basename(fname), 'size_mb': os.path.getsize(fname)/float(1 << 20),
+                             'data_mb': data_mb, 'mode': mode, 'mb_per_s': data_mb/best['total_s'],
+                             'peak_rss_mb': max(run['peak_rss_mb'] for run in runs)
+                             if best['peak_rss_mb'] is not None else None})
+                results.append(best)
+                print('%-36s %-11s %9.1f %9.4f %9.4f %9.4f %9.0f %9s' % (
+                    best['file'][:36], mode, data_mb, best['parse_s'], best['decode_s'], best['scan_s'],
+                    best['mb_per_s'], '%.0f' % best['peak_rss_mb'] if best['peak_rss_mb'] is not None else '-'))
+    finally:
+        shutil.rmtree(workdir)
+
+    with open(args.output, 'w') as f:
+        json.dump({'date': datetime.now().isoformat(), 'python': platform.python_version(),
+                   'numpy': np.__version__, 'platform': platform.platform(), 'repeat': args.repeat,
+                   'results': results}, f, indent=1)
+    print("Results written to %s" % args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  bench_threads.py  --- Concurrent reads stress test
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Shares one DM3 object per file among a pool of threads that read, in random
+order, the thumbnail, the images, regions, spectra, energy maps and the
+(lazily decoded) tags, and checks every result against a serial read.
+Exits with status 1 if any result differs.
+
+Usage: python benchmarks/bench_threads.py [-n TASKS] [-w WORKERS] [-s SEED] [FILE ...]
+'''
+
+import argparse
+import glob
+import os
+import random
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'utils'))
+
+from PyDM3 import DM3  # noqa: E402
+
+
+def make_tasks(ref, rng, count):
+    # returns (kind, function of a DM3 object, expected result) triples
+    names = list(ref.tags)
+    width, height, depth = ref._imageLayout()[3]
+    kinds = ['thumbnail', 'image', 'tags']
+    if depth > 1:
+        kinds += ['spectrum', 'map']
+    elif height > 1 and ref._imageLayout()[2] != 5:
+        kinds.append('region')
+    tasks = []
+    for i in range(count):
+        kind = rng.choice(kinds)
+        if kind == 'thumbnail':
+            task = lambda dm3: dm3._readThumbnail()
+        elif kind == 'image':
+            index = rng.randrange(len(ref.images))
+            task = lambda dm3, index=index: dm3._readImage(index)
+        elif kind == 'tags':
+            keys = rng.sample(names, min(20, len(names)))
+            task = lambda dm3, keys=keys: [dm3.tags[key] for key in keys]
+        elif kind == 'spectrum':
+            x, y = rng.randrange(width), rng.randrange(height)
+            task = lambda dm3, x=x, y=y: dm3.spectrumAt(x, y)
+        elif kind == 'map':
+            index = rng.randrange(depth)
+            task = lambda dm3, index=index: dm3.mapAt(index)
+        else:
+            x0, y0 = rng.randrange(width), rng.randrange(height)
+            x1, y1 = rng.randrange(x0, width) + 1, rng.randrange(y0, height) + 1
+            step = rng.choice((1, 1, 2, 5))
+            task = lambda dm3, r=(x0, y0, x1, y1, step): dm3.readRegion(*r)
+        tasks.append((kind, task, task(ref)))
+    return tasks
+
+
+def run(task, dm3):
+    # a read that raises (e.g. garbage read at a wrong position) counts as an error
+    try:
+        return task(dm3)
+    except Exception as e:
+        return e
+
+
+def same(a, b):
+    if isinstance(a, Exception):
+        return False
+    if isinstance(a, np.ndarray):
+        return a.shape == b.shape and np.array_equal(a, b, equal_nan=a.dtype.kind in 'fc')
+    return a == b
+
+
+def main():
+    examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'examples', '*.dm3')
+    parser = argparse.ArgumentParser(description='DM3 concurrent reads stress test')
+    parser.add_argument('-n', '--tasks', type=int, default=400, help='reads per file and mode')
+    parser.add_argument('-w', '--workers', type=int, default=8, help='pool size')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the random reads')
+    parser.add_argument('files', nargs='*', default=sorted(glob.glob(examples)))
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    modes = (('buffered', {}), ('lazy', {'lazy': True}), ('unbuffered', {'lazy': True, 'buffered': False}),
+             ('mmap', {'mmap_mode': 'r'}))
+    failures = 0
+    print('%-20s %-10s %6s %8s %10s' % ('file', 'mode', 'tasks', 'errors', 'reads/s'))
+    for fname in args.files:
+        tasks = make_tasks(DM3(fname), rng, args.tasks)
+        for mode, kwargs in modes:
+            shared = DM3(fname, **kwargs)
+            t0 = time()
+            with ThreadPoolExecutor(args.workers) as pool:
+                results = list(pool.map(lambda task: run(task[1], shared), tasks))
+            elapsed = time() - t0
+            errors = [kind for (kind, task, expected), result in zip(tasks, results) if not same(result, expected)]
+            failures += len(errors)
+            print('%-20s %-10s %6i %8i %10.0f%s' % (os.path.basename(fname), mode, len(tasks), len(errors),
+                                                    len(tasks)/elapsed, ' (%s)' % ', '.join(sorted(set(errors)))
+                                                    if errors else ''))
+    if failures:
+        raise SystemExit("%i reads returned wrong data" % failures)
+
+
+if __name__ == '__main__':
+    main()
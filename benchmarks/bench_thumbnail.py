@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  bench_thumbnail.py  --- Thumbnail extraction benchmark
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Measures the time needed to extract the thumbnails of a batch of DM3 files
+(as a file browser would) with a full open and with the thumbnail-only mode.
+
+Usage: python benchmarks/bench_thumbnail.py [-n COPIES] [FILE ...]
+'''
+
+import argparse
+import glob
+import os
+import sys
+from time import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'utils'))
+
+from PyDM3 import DM3  # noqa: E402
+
+
+def batch_time(files, **kwargs):
+    t0 = time()
+    for fname in files:
+        DM3(fname, **kwargs).thumbnail
+    return time() - t0
+
+
+def main():
+    examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'examples', '*.dm3')
+    parser = argparse.ArgumentParser(description='DM3 thumbnail extraction benchmark')
+    parser.add_argument('-n', '--copies', type=int, default=50, help='times each file is added to the batch')
+    parser.add_argument('files', nargs='*', default=sorted(glob.glob(examples)))
+    args = parser.parse_args()
+
+    for fname in args.files:
+        if not np.array_equal(DM3(fname).thumbnail, DM3(fname, thumbnail_only=True).thumbnail):
+            raise SystemExit("Thumbnails differ for '%s'" % fname)
+
+    files = args.files*args.copies
+    t_full = batch_time(files)
+    t_thumb = batch_time(files, thumbnail_only=True)
+    print('%i files' % len(files))
+    print('%-16s %10.3f s %10.1f files/s' % ('full open', t_full, len(files)/t_full))
+    print('%-16s %10.3f s %10.1f files/s' % ('thumbnail_only', t_thumb, len(files)/t_thumb))
+    print('speedup: %.1fx' % (t_full/t_thumb))
+
+
+if __name__ == '__main__':
+    main()
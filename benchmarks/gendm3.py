@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  gendm3.py  --- Synthetic DM3/DM4 file generator
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Writes valid synthetic DM3 (or DM4) files: a thumbnail, the main image of
+the chosen DataType and dimensions, and a tag tree of the chosen size. The
+image data is written a block at a time, so files of tens of GB can be
+generated; with the 'sparse' pattern the data is left as a hole in the
+file (all zeros, taking no disk space).
+
+Usage: python benchmarks/gendm3.py [-t TYPE] [-s WxH[xD]] [-g TAGS] [-v 3|4] [-p PATTERN] OUTPUT
+'''
+
+import argparse
+import struct
+
+import numpy as np
+
+# Encoded types of the tags
+SHORT, LONG, USHORT, ULONG, FLOAT, DOUBLE, BOOLEAN, CHAR, OCTET = 2, 3, 4, 5, 6, 7, 8, 9, 10
+LONGLONG, ULONGLONG = 11, 12
+STRUCT, STRING, ARRAY = 15, 18, 20
+
+# - DataType of the image -> (dtype of a pixel, encoded type of the array elements)
+DATATYPES = {
+    1: ('<i2', SHORT),
+    2: ('<f4', FLOAT),
+    3: ('<c8', FLOAT),
+    5: ('<f4', FLOAT),  # packed complex (FFT), stored as its real h x w layout
+    6: ('u1', OCTET),
+    7: ('<i4', LONG),
+    9: ('i1', OCTET),
+    10: ('<u2', USHORT),
+    11: ('<u4', ULONG),
+    12: ('<f8', DOUBLE),
+    13: ('<c16', DOUBLE),
+    14: ('u1', OCTET),
+    23: ('<u4', ULONG),  # RGBA
+}
+ELEMENTSIZE = {SHORT: 2, LONG: 4, USHORT: 2, ULONG: 4, FLOAT: 4, DOUBLE: 8, BOOLEAN: 1, OCTET: 1,
+               LONGLONG: 8, ULONGLONG: 8}
+PATTERNS = ('ramp', 'random', 'zeros', 'sparse')
+BLOCKSIZE = 1 << 24  # bytes of image data generated at a time
+
+
+class ArrayData(object):
+    """Array tag whose data is written by a function (a block at a time)."""
+
+    def __init__(self, etype, count, write):
+        self.etype = etype
+        self.count = count
+        self.write = write
+
+
+class Writer(object):
+    """Writes a tag tree (nested lists of (label, value)) in DM3/DM4 format."""
+
+    def __init__(self, f, version=3):
+        self.f = f
+        self.version = version
+        self.size = '>l' if version == 3 else '>q'  # counts and sizes
+
+    def pack(self, fmt, *values):
+        self.f.write(struct.pack(fmt, *values))
+
+    def group(self, items):
+        self.pack('>bb', 0, 1)  # sorted, open
+        self.pack(self.size, len(items))
+        for label, value in items:
+            self.entry(label, value)
+
+    def entry(self, label, value):
+        label = label.encode('latin-1')
+        is_group = isinstance(value, list)
+        self.pack('>bh', 20 if is_group else 21, len(label))
+        self.f.write(label)
+        if self.version == 4:
+            # - size of the tag, written once the tag is complete
+            size_pos = self.f.tell()
+            self.pack('>q', 0)
+        start = self.f.tell()
+        if is_group:
+            self.group(value)
+        else:
+            self.data(value)
+        if self.version == 4:
+            end = self.f.tell()
+            self.f.seek(size_pos)
+            self.pack('>q', end - start)
+            self.f.seek(end)
+
+    def data(self, value):
+        self.f.write(b'%%%%')
+        if isinstance(value, bool):
+            info, payload = [BOOLEAN], struct.pack('<?', value)
+        elif isinstance(value, int):
+            info, payload = [LONG], struct.pack('<l', value)
+        elif isinstance(value, float):
+            info, payload = [DOUBLE], struct.pack('<d', value)
+        elif isinstance(value, str):
+            payload = value.encode('utf_16_le')
+            info = [ARRAY, USHORT, len(payload)//2]
+        elif isinstance(value, ArrayData):
+            if self.version == 3 and value.count >= 1 << 31:
+                raise ValueError("%i elements do not fit in a DM3 array, use version 4" % value.count)
+            info, payload = [ARRAY, value.etype, value.count], None
+        else:
+            raise TypeError("Cannot write tag value %r" % (value,))
+        self.pack(self.size, len(info))
+        for i in info:
+            self.pack(self.size, i)
+        if payload is None:
+            value.write(self.f)
+        else:
+            self.f.write(payload)
+
+
+def pixel_blocks(dtype, count, pattern, seed=0):
+    # yields the pixels of the image (count pixels of dtype), a block at a time
+    rng = np.random.RandomState(seed)
+    step = max(1, BLOCKSIZE//dtype.itemsize)
+    for start in range(0, count, step):
+        n = min(step, count - start)
+        if pattern == 'zeros':
+            block = np.zeros(n, dtype=dtype)
+        elif pattern == 'random':
+            if dtype.kind == 'c':
+                block = (rng.standard_normal(n) + 1j*rng.standard_normal(n)).astype(dtype)
+            elif dtype.kind == 'f':
+                block = rng.standard_normal(n).astype(dtype)
+            else:
+                block = rng.randint(0, 1 << min(8*dtype.itemsize - 1, 30), n).astype(dtype)
+        else:  # ramp
+            block = (np.arange(start, start + n) % 251).astype(dtype)
+        yield block
+
+
+def image_group(dimensions, data_type, pattern, seed=0):
+    """Returns the ImageData tag group of an image with the given dimensions (fastest first)."""
+    dtype_str, etype = DATATYPES[data_type]
+    dtype = np.dtype(dtype_str)
+    count = int(np.prod(dimensions))
+    nbytes = count*dtype.itemsize
+
+    def write(f):
+        if pattern == 'sparse':
+            f.seek(nbytes, 1)  # a hole in the file, read as zeros
+            return
+        for block in pixel_blocks(dtype, count, pattern, seed):
+            f.write(block.tobytes())
+
+    units = ('nm', 'nm', 'eV')
+    calibrations = [('Brightness', [('Origin', 0.0), ('Scale', 1.0), ('Units', 'counts')]),
+                    ('Dimension', [('%i' % i, [('Origin', 0.0), ('Scale', 0.5 + i), ('Units', units[i % 3])])
+                                   for i in range(len(dimensions))])]
+    return [('Calibrations', calibrations),
+            ('Data', ArrayData(etype, nbytes//ELEMENTSIZE[etype], write)),
+            ('DataType', data_type),
+            ('Dimensions', [('%i' % i, n) for i, n in enumerate(dimensions)]),
+            ('PixelDepth', dtype.itemsize)]
+
+
+def metadata(ntags):
+    """Returns ntags tags (floats and strings) in groups of 10."""
+    return [('Group %i' % g, [('Tag %i' % t, float(t) if t % 3 else 'value %i' % t)
+                              for t in range(min(10, ntags - 10*g))])
+            for g in range((ntags + 9)//10)]
+
+
+def write(fname, dimensions, data_type=2, ntags=100, version=3, pattern='ramp', seed=0):
+    """Writes a synthetic DM3 (version 3) or DM4 (version 4) file.
+
+    dimensions are given fastest first (width, height[, depth]), as in the
+    Dimensions tags; the data of a 3D spectrum image (DataType 2) is written
+    with the energy axis slowest, as the reader expects.
+    """
+    images = [('0', [('ImageData', image_group((8, 8), 23, 'ramp'))]),
+              ('1', [('ImageData', image_group(dimensions, data_type, pattern, seed)),
+                     ('ImageTags', [('Microscope Info', [('Voltage', 200000.0), ('Operator', 'synthetic'),
+                                                         ('Indicated Magnification', 25000.0)])] + metadata(ntags)),
+                     ('Name', 'synthetic')])]
+    root = [('DocumentObjectList', [('0', [('ImageDisplayInfo', [('LowLimit', 0.0), ('HighLimit', 250.0)])])]),
+            ('ImageList', images)]
+    with open(fname, 'wb') as f:
+        w = Writer(f, version)
+        w.pack('>l', version)
+        w.pack(w.size, 0)  # indicated file size, not checked by the reader
+        w.pack('>l', 1)  # little endian data
+        w.group(root)
+        f.write(b'\0'*8)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic DM3/DM4 file generator')
+    parser.add_argument('output', help='file to write')
+    parser.add_argument('-t', '--type', type=int, default=2, choices=sorted(DATATYPES), help='image DataType')
+    parser.add_argument('-s', '--shape', default='1024x1024', help='dimensions, fastest first (WxH or WxHxD)')
+    parser.add_argument('-g', '--tags', type=int, default=100, help='number of metadata tags')
+    parser.add_argument('-v', '--version', type=int, default=3, choices=(3, 4), help='file format version')
+    parser.add_argument('-p', '--pattern', default='ramp', choices=PATTERNS, help='image data')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random pattern')
+    args = parser.parse_args()
+
+    dimensions = tuple(int(n) for n in args.shape.lower().split('x'))
+    write(args.output, dimensions, args.type, args.tags, args.version, args.pattern, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  DM3Catalog.py  --- Metadata catalog of DM3 files
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Keeps the experiment information (DM3.info) and the image size of the DM3
+files in a folder tree in a SQLite database, so they can be searched by
+magnification, voltage, operator, acquisition date...
+
+Only new or changed files (by size and modification time) are parsed again
+when the catalog is refreshed.
+
+Usage: python DM3Catalog.py DATABASE [DIRECTORY ...] [-q COLUMN=VALUE ...]
+'''
+
+import fnmatch
+import os
+import re
+import sqlite3
+from datetime import datetime
+
+try:
+    from .PyDM3 import openMany
+except ImportError:  # used as a stand-alone module
+    from PyDM3 import openMany
+
+# - columns of the catalog (besides path, size and mtime_ns), with their types
+COLUMNS = (
+    ('name', 'TEXT'),
+    ('descrip', 'TEXT'),
+    ('micro', 'TEXT'),
+    ('mode', 'TEXT'),
+    ('operator', 'TEXT'),
+    ('specimen', 'TEXT'),
+    ('hv', 'REAL'),
+    ('mag', 'REAL'),
+    ('acq_date', 'TEXT'),
+    ('acq_time', 'TEXT'),
+    ('acquired', 'TEXT'),  # acquisition date and time in ISO format (if it could be parsed)
+    ('width', 'INTEGER'),
+    ('height', 'INTEGER'),
+    ('depth', 'INTEGER'),
+    ('datatype', 'INTEGER'),
+    ('error', 'TEXT'),  # why the file could not be read
+)
+COLUMNNAMES = ('path', 'size', 'mtime_ns') + tuple(name for name, sqltype in COLUMNS)
+
+# - formats tried (in order) to parse the acquisition date and time
+DATEFORMATS = ('%m/%d/%Y %I:%M:%S %p', '%d/%m/%Y %I:%M:%S %p', '%d/%m/%Y %H:%M:%S', '%m/%d/%Y %H:%M:%S',
+               '%Y-%m-%d %H:%M:%S')
+# - 'a.m.' and 'p.m.' (Spanish locales, among others), written as AM and PM for strptime
+MERIDIEM = re.compile(r'\b([ap])\.\s*m\.', re.IGNORECASE)
+
+
+def acquisitionTime(acq_date, acq_time):
+    """Returns the acquisition date and time in ISO format (None if unknown)."""
+    if not acq_date or not acq_time:
+        return None
+    acquired = MERIDIEM.sub(lambda m: m.group(1).upper() + 'M', "%s %s" % (acq_date.strip(), acq_time.strip()))
+    for fmt in DATEFORMATS:
+        try:
+            return datetime.strptime(acquired, fmt).isoformat()
+        except ValueError:
+            pass
+    return None
+
+
+def catalogRow(result):
+    """Returns the catalog row (a dict) of a PyDM3.DM3Result with layout and info."""
+    row = dict.fromkeys(name for name, sqltype in COLUMNS)
+    if result.error is not None:
+        row['error'] = repr(result.error)
+        return row
+    for key, value in result.info.items():
+        if key in row:
+            row[key] = value
+    row['acquired'] = acquisitionTime(row['acq_date'], row['acq_time'])
+    datatype, dimensions = result.layout
+    row['datatype'] = datatype
+    for key, size in zip(('width', 'height', 'depth'), dimensions + (1, 1, 1)):
+        row[key] = size
+    return row
+
+
+class DM3Catalog(object):
+    """SQLite catalog of DM3 files.
+
+    refresh() adds the new and changed files of a folder tree and removes
+    the deleted ones; query() searches the catalog.
+    """
+
+    def __init__(self, database):
+        self._database = database
+        self._db = sqlite3.connect(database)
+        self._db.row_factory = sqlite3.Row
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, "
+                             "mtime_ns INTEGER, %s)" % ", ".join("%s %s" % column for column in COLUMNS))
+            for column in ('mag', 'hv', 'operator', 'acquired'):
+                self._db.execute("CREATE INDEX IF NOT EXISTS files_%s ON files (%s)" % (column, column))
+            # - dates that could not be parsed when the files were catalogued (e.g. with 'p.m.')
+            undated = self._db.execute("SELECT path, acq_date, acq_time FROM files "
+                                       "WHERE acquired IS NULL AND acq_date != ''").fetchall()
+            self._db.executemany("UPDATE files SET acquired = ? WHERE path = ?",
+                                 ((acquisitionTime(acq_date, acq_time), path) for path, acq_date, acq_time in undated))
+
+    @property
+    def database(self):
+        """Returns the path of the database."""
+        return self._database
+
+    def close(self):
+        """Closes the database."""
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def refresh(self, directory, pattern='*.dm[34]', recursive=True, workers=1, processes=False):
+        """Brings the catalog of the files in directory up to date.
+
+        The files are those whose names match pattern, ignoring case (DM3
+        and DM4 files by default).
+
+        Only the files whose size or modification time changed since the last
+        refresh are parsed, by a pool of workers threads (or processes). Returns
+        the number of files added, updated, unchanged and removed (as a dict).
+        """
+        # - files on disk
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(os.path.abspath(directory)):
+            for fname in filenames:
+                if not fnmatch.fnmatchcase(fname.lower(), pattern.lower()):
+                    continue
+                path = os.path.join(dirpath, fname)
+                st = os.stat(path)
+                found[path] = (st.st_size, st.st_mtime_ns)
+            if not recursive:
+                break
+
+        # - files in the catalog
+        prefix = os.path.join(os.path.abspath(directory), '')
+        known = {}
+        for path, size, mtime_ns in self._db.execute("SELECT path, size, mtime_ns FROM files WHERE substr(path, 1, ?) = ?",
+                                                     (len(prefix), prefix)):
+            if recursive or os.path.dirname(path) == prefix[:-1]:
+                known[path] = (size, mtime_ns)
+
+        changed = [path for path, key in found.items() if known.get(path) != key]
+        removed = [path for path in known if path not in found]
+        counts = {'added': 0, 'updated': 0, 'unchanged': len(found) - len(changed), 'removed': len(removed)}
+
+        with self._db:
+            self._db.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in removed))
+            for result in openMany(changed, workers=workers, what=('layout', 'info'), ordered=False,
+                                   processes=processes, lazy=True):
+                row = catalogRow(result)
+                row['path'] = result.filename
+                row['size'], row['mtime_ns'] = found[result.filename]
+                self._db.execute("INSERT OR REPLACE INTO files (%s) VALUES (%s)" % (
+                    ", ".join(COLUMNNAMES), ", ".join("?"*len(COLUMNNAMES))), [row[name] for name in COLUMNNAMES])
+                counts['updated' if result.filename in known else 'added'] += 1
+        return counts
+
+    def query(self, order_by='path', **conditions):
+        """Returns the catalog rows (as dicts) matching all the conditions.
+
+        Each condition is COLUMN=VALUE, where VALUE can be a value (equality),
+        a string with * or ? wildcards (glob match), a (min, max) tuple (range,
+        None for an open end) or a list (any of its values). For example:
+
+            catalog.query(operator='John*', mag=(20000, None), hv=[200000.0, 300000.0])
+        """
+        where = []
+        args = []
+        for column, value in conditions.items():
+            if column not in COLUMNNAMES:
+                raise ValueError("Unknown column %r" % column)
+            if isinstance(value, tuple):
+                low, high = value
+                if low is not None:
+                    where.append("%s >= ?" % column)
+                    args.append(low)
+                if high is not None:
+                    where.append("%s <= ?" % column)
+                    args.append(high)
+            elif isinstance(value, list):
+                where.append("%s IN (%s)" % (column, ", ".join("?"*len(value))))
+                args.extend(value)
+            elif value is None:
+                where.append("%s IS NULL" % column)
+            elif isinstance(value, str) and ('*' in value or '?' in value):
+                where.append("%s GLOB ?" % column)
+                args.append(value)
+            else:
+                where.append("%s = ?" % column)
+                args.append(value)
+        if order_by not in COLUMNNAMES:
+            raise ValueError("Unknown column %r" % order_by)
+        sql = "SELECT * FROM files"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY %s" % order_by
+        return [dict(row) for row in self._db.execute(sql, args)]
+
+
+# Main
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='DM3 metadata catalog')
+    parser.add_argument('database', help='SQLite database of the catalog')
+    parser.add_argument('directories', nargs='*', help='folders to add to (or refresh in) the catalog')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='number of files parsed at a time')
+    parser.add_argument('-q', '--query', action='append', default=[], metavar='COLUMN=VALUE',
+                        help='show the files matching the condition (may be repeated)')
+    args = parser.parse_args()
+
+    catalog = DM3Catalog(args.database)
+    for directory in args.directories:
+        print("%s: %s" % (directory, catalog.refresh(directory, workers=args.workers)))
+    if args.query:
+        conditions = dict(condition.split('=', 1) for condition in args.query)
+        for row in catalog.query(**conditions):
+            print("%s\t%s" % (row['path'], "\t".join("%s=%s" % (key, row[key]) for key in conditions)))
+    catalog.close()
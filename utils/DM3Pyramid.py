@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+#
+#  DM3Pyramid.py  --- Multi-resolution pyramid of DM3 images
+#     This file is part of DM3Viewer, a simple PyQt application to
+#      view and export DM3 files.
+#
+#  Copyright (C) 2018-2023 Ovidio Peña Rodríguez <ovidio@bytesfall.com>
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <http://www.gnu.org/licenses/>.
+'''
+Keeps 2x-downsampled copies (levels) of a 2D image in the user cache, so a
+large micrograph can be displayed from the level that matches the zoom
+instead of the full resolution data.
+
+Each level is the 2x2 block mean of the previous one (an odd last row or
+column is dropped), computed a block of rows at a time. The levels are
+saved as .npy files, mapped when they are used, and reused while the DM3
+file does not change; the least recently used pyramids are removed when
+the cache grows over PYRAMIDCACHESIZE. The pyramids of DM3 data that is
+not a file on disk (buffers, zip members...) are kept in memory, and so
+are the levels that cannot be saved (e.g. a read-only cache directory).
+'''
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+try:
+    from .PyDM3 import CHUNKSIZE, cacheDir, pruneCache, touchCache
+except ImportError:  # used as a stand-alone module
+    from PyDM3 import CHUNKSIZE, cacheDir, pruneCache, touchCache
+
+MINSIZE = 256  # the coarsest level is not larger than this (in both directions)
+PYRAMID_VERSION = 1  # format of the cached levels
+PYRAMIDCACHESIZE = 4 << 30  # bytes of levels kept in the user cache
+
+
+def halve(src, dst):
+    """Writes the 2x2 block mean of src into dst, a block of rows at a time."""
+    rows, cols = dst.shape
+    chunk = max(1, CHUNKSIZE//max(1, 4*cols))
+    for r0 in range(0, rows, chunk):
+        r1 = min(r0 + chunk, rows)
+        block = np.asarray(src[2*r0:2*r1, :2*cols], dtype=dst.dtype)
+        dst[r0:r1] = block.reshape(r1 - r0, 2, cols, 2).mean(axis=(1, 3))
+
+
+class ImagePyramid(object):
+    """Pyramid of 2x-downsampled levels of the (chosen) image of a DM3 object.
+
+    Level 0 is DM3.image itself; level k is 2**k times smaller. The levels
+    are built (and saved in directory, by default the user cache) the first
+    time the pyramid of a file is requested; only in memory if the DM3 data
+    is not a file on disk or the cache cannot be written (error keeps the
+    OSError of the cache, if any).
+    """
+
+    def __init__(self, dm3, directory=None, minsize=MINSIZE):
+        image = dm3.image
+        if image.ndim != 2 or np.iscomplexobj(image):
+            raise ValueError("Pyramids can only be built for real 2D images.")
+        self._levels = [image]
+        self._stats = None
+        self._name = None
+        self.error = None
+        if dm3._source.path is None:
+            self._build(dm3, minsize)
+            return
+        try:
+            self._directory = directory if directory is not None else cacheDir('pyramids')
+            path = os.path.realpath(dm3._source.path)
+            st = os.stat(path)
+        except OSError as e:
+            self._uncached(dm3, e)
+            self._build(dm3, minsize)
+            return
+        key = "%s|%i|%i|%i|%i|%i" % (path, st.st_size, st.st_mtime_ns, dm3.chosenimage, minsize, PYRAMID_VERSION)
+        self._name = os.path.join(self._directory, hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest())
+        if self._load():
+            touchCache(self._name + '.json')
+            return
+        self._build(dm3, minsize)
+        if self._name is not None:
+            try:
+                pruneCache(self._directory, PYRAMIDCACHESIZE, keep=os.path.basename(self._name))
+            except OSError as e:
+                self._uncached(dm3, e)
+
+    def __len__(self):
+        return len(self._levels)
+
+    @property
+    def levels(self):
+        """Returns the list of levels (numpy arrays), from the finest."""
+        return self._levels
+
+    @property
+    def stats(self):
+        """Returns min, max and mean of the full resolution image (as a dict)."""
+        return self._stats
+
+    def level(self, index):
+        """Returns level index (0 is the full resolution image)."""
+        return self._levels[index]
+
+    def levelFor(self, cols, rows=0):
+        """Returns the coarsest level with at least cols columns and rows rows."""
+        for level in reversed(self._levels):
+            if level.shape[1] >= cols and level.shape[0] >= rows:
+                return level
+        return self._levels[0]
+
+    def _load(self):
+        # maps the cached levels, returns False if they are not (all) there
+        try:
+            with open(self._name + '.json') as f:
+                meta = json.load(f)
+            levels = [np.load('%s.%i.npy' % (self._name, i), mmap_mode='r') for i in range(1, meta['levels'])]
+        except (IOError, OSError, ValueError, KeyError):
+            return False
+        self._levels.extend(levels)
+        self._stats = meta['stats']
+        return True
+
+    def _uncached(self, dm3, error):
+        # the cache cannot be used: the (remaining) levels are kept in memory
+        dm3._log("pyramid not cached: %s", error)
+        self.error = error
+        self._name = None
+
+    def _save(self, src, entry, shape, dtype):
+        # writes the level halving src as entry, returns it mapped
+        fd, tmp = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            dst = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=shape)
+            halve(src, dst)
+            dst.flush()
+            del dst
+            os.replace(tmp, entry)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return np.load(entry, mmap_mode='r')
+
+    def _build(self, dm3, minsize):
+        # computes the levels and writes them (and their description, last) to the cache
+        src = self._levels[0]
+        dtype = np.result_type(src.dtype, np.float32)
+        while max(src.shape) > minsize and min(src.shape) >= 2:
+            shape = (src.shape[0]//2, src.shape[1]//2)
+            if self._name is None:
+                # - not cached, kept in memory
+                src = np.empty(shape, dtype=dtype)
+                halve(self._levels[-1], src)
+                self._levels.append(src)
+                continue
+            try:
+                src = self._save(src, '%s.%i.npy' % (self._name, len(self._levels)), shape, dtype)
+            except OSError as e:
+                self._uncached(dm3, e)
+                continue
+            self._levels.append(src)
+        self._stats = dict((key, float(value)) for key, value in dm3.imagestats.items())
+        if self._name is None:
+            return
+        tmp = None
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self._directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'levels': len(self._levels), 'stats': self._stats}, f)
+            os.replace(tmp, self._name + '.json')
+        except OSError as e:
+            if tmp is not None and os.path.exists(tmp):
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+            self._uncached(dm3, e)
@@ -23,6 +23,28 @@ Created on Mar 1, 2018
 
 @author: ovidio
 '''
-from utils.Options import Options, OptionsDlg
-from utils.plot import Plot3D
+
+# The GUI classes (PyQt5, matplotlib) are only imported when they are first
+# used, so the DM3 reader (utils.PyDM3, numpy only) can be imported alone.
+_lazy = {
+    'Options': 'utils.Options',
+    'OptionsDlg': 'utils.Options',
+    'Plot3D': 'utils.plot',
+}
+
+__all__ = sorted(_lazy)
+
+
+def __getattr__(name):
+    if name not in _lazy:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    import importlib
+
+    value = getattr(importlib.import_module(_lazy[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
 
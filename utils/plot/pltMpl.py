@@ -28,7 +28,9 @@ Created on Feb 05, 2018
 @author: ovidio
 '''
 
+import logging
 import os
+from time import perf_counter
 
 import matplotlib
 import numpy as np
@@ -47,6 +49,7 @@ from mpl_toolkits.axes_grid1.anchored_artists import AnchoredSizeBar
 slider_max = 1000.0
 slider_interval = 50
 scale_values = [1, 5, 10, 20, 50, 100, 200, 500, 800, 1000]
+pyramid_size = 2048  # images larger than this are displayed from a pyramid of downsampled levels
 
 
 def save_image(fname, data, size=(1, 1), dpi=80, cmap='hot', scale_pos=3, zrange=None, scale=1.0, units='nm'):
@@ -111,8 +114,12 @@ class Mpl3DPlot(FigureCanvas):
     def __init__(self, parent=None, width=8.0, height=6.0, dpi=150, toolbar=True, cmap='gray', scale_pos=3):
         self._fname = None
         self._dm3 = None
+        # - called as hook(dm3, stage, seconds, counts) after each stage of the reads (see PyDM3.addHook)
+        self.hooks = []
         self._data = None
         self._fdata = None
+        self._zrange = None
+        self._pyramid = None
         self._switch_fft = None
 
         self._curve = None
@@ -236,9 +243,14 @@ class Mpl3DPlot(FigureCanvas):
         self._fig.canvas.draw()
 
         self._fname = ''
+        if self._dm3 is not None:
+            # - release the cached data and the tag buffer of the previous file
+            self._dm3.close()
         self._dm3 = None
         self._data = None
         self._fdata = None
+        self._zrange = None
+        self._pyramid = None
         self._switch_fft = False
         (self._origin_x, self._scale_x, self._units_x) = (0.0, 0.0, '')
         (self._origin_y, self._scale_y, self._units_y) = (0.0, 0.0, '')
@@ -278,6 +290,8 @@ class Mpl3DPlot(FigureCanvas):
 
             self._scale_x = 1.0/self.size_x
             self._scale_y = 1.0/self.size_y
+            self._fdata = None
+            self._zrange = None
 
         self._switch_fft = bool(value)
 
@@ -315,14 +329,9 @@ class Mpl3DPlot(FigureCanvas):
         if self.data_is_spectra:
             if self.data_dim == 1:
                 return self.data
-            else:
-                idx = self.index
-                data = self.data
-                for n in self.data.shape[:-1]:
-                    data = data[idx%n]
-                    idx = idx//n
-
-                return data
+            else:  # Read only the spectrum at the selected pixel from the file
+                (x_idx, y_idx) = self.index_array
+                return self.dm3.spectrumAt(x_idx, y_idx)
         else:
             return None
 
@@ -352,18 +361,24 @@ class Mpl3DPlot(FigureCanvas):
             return self._data
 
     @property
-    def zmin(self):
+    def zrange(self):
         if self.data is None:
-            return 0.0
-        else:
-            return np.amin(self.data)
+            return (0.0, 0.0)
+        if self._zrange is None:
+            if self._switch_fft or self.data_is_complex:
+                self._zrange = (np.amin(self.data), np.amax(self.data))
+            else:  # Unmodified image data, reuse the statistics cached by DM3 (or the pyramid)
+                stats = self._pyramid.stats if self._pyramid is not None else self.dm3.imagestats
+                self._zrange = (stats['min'], stats['max'])
+        return self._zrange
+
+    @property
+    def zmin(self):
+        return self.zrange[0]
 
     @property
     def zmax(self):
-        if self.data is None:
-            return 0.0
-        else:
-            return np.amax(self.data)
+        return self.zrange[1]
 
     @property
     def vmin(self):
@@ -589,9 +604,48 @@ class Mpl3DPlot(FigureCanvas):
         from utils.PyDM3 import DM3
 
         if os.path.exists(self._fname):
-            self._dm3 = DM3(self._fname)
+            t0 = perf_counter()
+            # - copy-on-write map: no extra copy of the data, which is paged in on demand
+            # - lazy tags: metadata groups are only decoded when they are needed
+            self._dm3 = DM3(self._fname, mmap_mode='c', lazy=True, tag_cache=True, hooks=self.hooks)
+            self.loadImage()
+            # - latency of the file and its breakdown by stage (header, tags, read, decode, reshape)
+            logging.getLogger('DM3Viewer').info("%s shown in %.1f ms: %s", os.path.basename(self._fname),
+                                                1000*(perf_counter() - t0), self._dm3.timings)
+        else:
+            self.clearPlot()
+
+    @property
+    def no_images(self):
+        # images in the file, besides the thumbnail (entry 0)
+        return len(self.dm3.images) - 1 if self.dm3 is not None else 0
+
+    @property
+    def image_index(self):
+        return self.dm3.chosenimage if self.dm3 is not None else 0
+
+    @image_index.setter
+    def image_index(self, value):
+        # switch to another image of the file (the tags are not parsed again)
+        if (self.dm3 is not None) and (1 <= value <= self.no_images) and (value != self.dm3.chosenimage):
+            self.dm3.chosenimage = value
+            self._axes.clear()
+            self._im = None
+            self.loadImage()
+
+    def loadImage(self):
+        if self.dm3 is not None:
+            # - a spectrum image stays a [x, y, energy] view of the map: nothing is read until a
+            #   spectrum is shown (spectrumAt reads only its samples)
             self._data = self.dm3.imagedata
             self._fdata = None
+            self._zrange = None
+            self._pyramid = None
+            if self.data_dim == 2 and not self.data_is_complex and max(self._data.shape) > pyramid_size:
+                from utils.DM3Pyramid import ImagePyramid
+
+                # - large image: display the downsampled level that matches the zoom
+                self._pyramid = ImagePyramid(self.dm3)
             (self._origin_x, self._scale_x, self._units_x) = self.dm3.axisunits(0)
             if self.data_dim > 1:
                 (self._origin_y, self._scale_y, self._units_y) = self.dm3.axisunits(1)
@@ -604,8 +658,9 @@ class Mpl3DPlot(FigureCanvas):
             self._switch_fft = False
 
             #TODO: Check how to deal with complex values
-            self._min_slider.setValue(round(slider_max*(self.vmin - self.zmin)/(self.zmax - self.zmin)))
-            self._max_slider.setValue(round(slider_max*(self.vmax - self.zmin)/(self.zmax - self.zmin)))
+            if not self.data_is_spectra:  # Spectra have no contrast limits (and the cube is not scanned)
+                self._min_slider.setValue(round(slider_max*(self.vmin - self.zmin)/(self.zmax - self.zmin)))
+                self._max_slider.setValue(round(slider_max*(self.vmax - self.zmin)/(self.zmax - self.zmin)))
 
             self._min_slider.setEnabled(not self.data_is_spectra)
             self._max_slider.setEnabled(not self.data_is_spectra)
@@ -622,12 +677,14 @@ class Mpl3DPlot(FigureCanvas):
                 self._idx_val.setText('0, 0')
                 self._min_lbl.setText('{:.4g}'.format(0))
                 self._max_lbl.setText('{:.4g}'.format(1))
+            else:
+                self._idx_slider.setRange(0, 0)
+                self._idx_slider.setValue(0)
+                self._idx_slider.setEnabled(False)
 
             self.plot3Ddata()
 
             self.dataChanged.emit()
-        else:
-            self.clearPlot()
 
     def writeFile(self, fname, zoom=1.0, base_dpi=400):
         if self.valid_source and fname is not None:
@@ -698,12 +755,16 @@ class Mpl3DPlot(FigureCanvas):
                 self._fig.canvas.draw()
             else:  # It is (should be) a 2D image
                 self._axes.clear()
+                self._im = None
 
                 # Interpolation can be 'nearest', 'bilinear' or 'bicubic'
-                self._im = self._axes.imshow(self.data, interpolation='nearest', cmap=plt.get_cmap(self._cmap),
+                self._im = self._axes.imshow(self.zoomLevel(), interpolation='nearest',
+                                             cmap=plt.get_cmap(self._cmap),
                                              vmin=self.zmin, vmax=self.zmax,
                                              extent=(
                                                  self.range_x[0], self.range_x[-1], self.range_y[0], self.range_y[-1]))
+                self._axes.callbacks.connect('xlim_changed', self.onZoom)
+                self._axes.callbacks.connect('ylim_changed', self.onZoom)
 
                 if 0 < self._scale_pos <= 10:
                     scale_units = self.units_x
@@ -750,6 +811,29 @@ class Mpl3DPlot(FigureCanvas):
             # Update the colormap
             self.updateColorMap()
 
+    def zoomLevel(self):
+        # returns the data to display: the pyramid level with about one pixel per screen pixel
+        if self._pyramid is None or self._switch_fft:
+            return self.data
+        bbox = self._axes.get_window_extent()
+        if self._im is None:  # whole image
+            return self._pyramid.levelFor(bbox.width, bbox.height)
+        (left, right, bottom, top) = self._im.get_extent()
+        (x0, x1) = self._axes.get_xlim()
+        (y0, y1) = self._axes.get_ylim()
+        fx = abs(x1 - x0)/abs(right - left) if right != left else 1.0
+        fy = abs(y1 - y0)/abs(top - bottom) if top != bottom else 1.0
+        return self._pyramid.levelFor(bbox.width/max(fx, 1e-6), bbox.height/max(fy, 1e-6))
+
+    def onZoom(self, axes):
+        # Show the pyramid level that matches the new view limits
+        if (self._im is None) or (self._pyramid is None) or self._switch_fft:
+            return
+        level = self.zoomLevel()
+        if level.shape != self._im.get_array().shape:
+            self._im.set_data(level)
+            self._fig.canvas.draw_idle()
+
     def updateColorMap(self, min_value=None, max_value=None):
         if (self._im is not None) and (type(self._im) is AxesImage):  # and (self.data_height > 1):
             if min_value is None:
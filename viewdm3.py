@@ -76,6 +76,12 @@ class DM3Viewer(QtWidgets.QMainWindow):
         self.action_Next_Image.triggered.connect(self.plot.nextFile)
         self.action_Last_Image.triggered.connect(self.plot.lastFile)
 
+        # Switch between the images stored in the same file
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+PgDown"), self,
+                            activated=lambda: setattr(self.plot, 'image_index', self.plot.image_index + 1))
+        QtWidgets.QShortcut(QtGui.QKeySequence("Ctrl+PgUp"), self,
+                            activated=lambda: setattr(self.plot, 'image_index', self.plot.image_index - 1))
+
         self.action_Info.triggered.connect(self.imageInfo)
         self.action_FFT.triggered.connect(self.switchFFT)
 
@@ -103,7 +109,10 @@ class DM3Viewer(QtWidgets.QMainWindow):
         self.setTitle()
 
     def setTitle(self):
-        if os.path.exists(self.plot.fname):
+        if os.path.exists(self.plot.fname) and self.plot.no_images > 1:
+            self.setWindowTitle('DM3 Viewer - %s (image %i of %i)' % (os.path.basename(self.plot.fname),
+                                                                      self.plot.image_index, self.plot.no_images))
+        elif os.path.exists(self.plot.fname):
             self.setWindowTitle('DM3 Viewer - ' + os.path.basename(self.plot.fname))
         else:
             self.setWindowTitle('DM3 Viewer')
@@ -386,6 +395,14 @@ if __name__ == '__main__':
     import sys
     import DM3Viewer_rc
 
+    # - DM3VIEWER_LOG=INFO logs the time taken to show each file, DEBUG also each stage of the reads
+    if os.environ.get('DM3VIEWER_LOG'):
+        import logging
+        from utils.PyDM3 import addHook, logHook
+
+        logging.basicConfig(level=os.environ['DM3VIEWER_LOG'].upper(), format='%(asctime)s %(name)s: %(message)s')
+        addHook(logHook)
+
     app = QtWidgets.QApplication(sys.argv)
     app.setApplicationName(version.__name__)
     app.setApplicationVersion(version.__version__)